@@ -1,6 +1,30 @@
+import heapq
 import os
+import sys
+from collections.abc import Iterator
+from itertools import product
+from pathlib import Path
 from shutil import rmtree
 
+# Constant representing the letters of the alphabet considered by the analysis.
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+# Constant representing every byte that is not a letter of the alphabet, removed from the text before the analysis.
+NON_ALPHABET_BYTES = bytes(byte for byte in range(256) if chr(byte) not in ALPHABET)
+
+# Constant representing the translation tables that undo the shift caused by each key letter.
+# Each table maps every letter to the letter 'key_letter' positions before it, keeping any other byte unchanged.
+DECRYPTION_TABLES = {
+    key_letter: bytes.maketrans(ALPHABET.encode(), (ALPHABET[-shift:] + ALPHABET[:-shift]).encode())
+    for shift, key_letter in enumerate(ALPHABET)
+}
+
+# Constant representing the longest key length that is tried.
+MAX_KEY_LENGTH = 20
+
+# Constant representing the shortest sub-text whose index of coincidence is considered reliable.
+MIN_SUB_TEXT_LENGTH = 50
+
 # Constant representing the typical index of coincidence for English and Portuguese texts.
 ENGLISH_COINCIDENCE_INDEX = 0.066
 PORTUGUESE_COINCIDENCE_INDEX = 0.074
@@ -9,55 +33,80 @@ PORTUGUESE_COINCIDENCE_INDEX = 0.074
 ENGLISH_MOST_FREQUENT_LETTERS = ["e", "t"]
 PORTUGUESE_MOST_FREQUENT_LETTERS = ["a", "e"]
 
+# Constant representing the typical relative frequencies of the most frequent letters in English and Portuguese texts.
+ENGLISH_MOST_FREQUENT_LETTERS_FREQUENCIES = [0.127, 0.0905]
+PORTUGUESE_MOST_FREQUENT_LETTERS_FREQUENCIES = [0.1463, 0.1257]
 
-# Function to check if the text is likely English based on the frequency of the most frequent letters.
-def is_text_english(letters_map: dict[str, int]) -> bool:
+
+# Function to get the relative frequencies of the two most frequent letters of every text.
+def get_most_frequent_letters_frequencies(letters_counts_matrix: list[list[int]]) -> list[list[float]]:
     """
-    Check if the text is likely to be English based on the frequency of the most frequent letters.
+    Get the relative frequencies of the two most frequent letters of every text.
 
     Args:
-        letters_map (dict[str, int]): A dictionary with letters as keys and their frequencies as values.
+        letters_counts_matrix (list[list[int]]): The number of occurrences of each letter of the alphabet, one row per text.
 
     Returns:
-        bool: True if the text is likely to be English, False otherwise.
+        list[list[float]]: The relative frequencies of the most frequent and second most frequent letters of each text.
+    """
+    # Calculate the relative frequency of the most frequent and second most frequent letters of each text.
+    # This is done once, so the English and Portuguese checks share the result.
+    most_frequent_letters_frequencies = []
+    for letters_counts in letters_counts_matrix:
+        total_letters = sum(letters_counts)
+        most_frequent_letters_frequencies.append(
+            [frequency / total_letters for frequency in heapq.nlargest(2, letters_counts)])
+    return most_frequent_letters_frequencies
+
+
+# Function to check if the two most frequent letters of every text have the expected relative frequencies.
+def most_frequent_letters_match(most_frequent_letters_frequencies: list[list[float]], expected_frequencies: list[float], tolerance: float) -> bool:
     """
-    # Calculate the relative frequency of the most frequent and second most frequent letters.
-    # Compare these frequencies with typical values for English.
-    # If the frequencies are close to typical English values, return True.
-    # Otherwise, return False.
-    total_letters = sum(letters_map.values())
-    sorted_letters_map = sorted(
-        letters_map.items(), key=lambda x: x[1], reverse=True)
-    most_frequent_letter = sorted_letters_map[0][0]
-    second_most_frequent_letter = sorted_letters_map[1][0]
+    Check if the two most frequent letters of every text have the expected relative frequencies.
+
+    Args:
+        most_frequent_letters_frequencies (list[list[float]]): The relative frequencies of the two most frequent letters of each text.
+        expected_frequencies (list[float]): The expected relative frequencies of the most frequent and second most frequent letters.
+        tolerance (float): The maximum accepted difference between a relative frequency and its expected value.
 
-    if abs(letters_map[most_frequent_letter] / total_letters - 0.127) < 0.01 and abs(letters_map[second_most_frequent_letter] / total_letters - 0.0905) < 0.01:
-        return True
+    Returns:
+        bool: True if the frequencies of all texts are close to the expected values, False otherwise.
+    """
+    # Compare the relative frequencies of each text with the expected values,
+    # stopping at the first text that does not match.
+    return all(abs(frequency - expected_frequency) < tolerance
+               for frequencies in most_frequent_letters_frequencies
+               for frequency, expected_frequency in zip(frequencies, expected_frequencies))
 
 
-# Function to check if the text is likely Portuguese based on the frequency of the most frequent letters.
-def is_text_portuguese(letters_map: dict[str, int]) -> bool:
+# Function to check if the texts are likely English based on the frequency of the most frequent letters.
+def is_text_english(most_frequent_letters_frequencies: list[list[float]]) -> bool:
     """
-    Check if the text is likely to be Portuguese based on the frequency of the most frequent letters.
+    Check if all the texts are likely to be English based on the frequency of the most frequent letters.
 
     Args:
-        letters_map (dict[str, int]): A dictionary with letters as keys and their frequencies as values.
+        most_frequent_letters_frequencies (list[list[float]]): The relative frequencies of the two most frequent letters of each text.
 
     Returns:
-        bool: True if the text is likely to be Portuguese, False otherwise.
+        bool: True if all the texts are likely to be English, False otherwise.
+    """
+    # Compare the frequencies of the two most frequent letters of every text with typical values for English.
+    return most_frequent_letters_match(most_frequent_letters_frequencies, ENGLISH_MOST_FREQUENT_LETTERS_FREQUENCIES, 0.01)
+
+
+# Function to check if the texts are likely Portuguese based on the frequency of the most frequent letters.
+def is_text_portuguese(most_frequent_letters_frequencies: list[list[float]]) -> bool:
     """
-    # Calculate the relative frequency of the most frequent and second most frequent letters.
-    # Compare these frequencies with typical values for Portuguese.
-    # If the frequencies are close to typical Portuguese values, return True.
-    # Otherwise, return False.
-    total_letters = sum(letters_map.values())
-    sorted_letters_map = sorted(
-        letters_map.items(), key=lambda x: x[1], reverse=True)
-    most_frequent_letter = sorted_letters_map[0][0]
-    second_most_frequent_letter = sorted_letters_map[1][0]
+    Check if all the texts are likely to be Portuguese based on the frequency of the most frequent letters.
 
-    if abs(letters_map[most_frequent_letter] / total_letters - 0.1463) < 0.03 and abs(letters_map[second_most_frequent_letter] / total_letters - 0.1257) < 0.03:
-        return True
+    Args:
+        most_frequent_letters_frequencies (list[list[float]]): The relative frequencies of the two most frequent letters of each text.
+
+    Returns:
+        bool: True if all the texts are likely to be Portuguese, False otherwise.
+    """
+    # Compare the frequencies of the two most frequent letters of every text with typical values for Portuguese.
+    return most_frequent_letters_match(most_frequent_letters_frequencies, PORTUGUESE_MOST_FREQUENT_LETTERS_FREQUENCIES, 0.03)
 
 
 # Function to pretty print a list of floats.
@@ -76,89 +125,103 @@ def pretty_print_float_array(array: list[float]) -> str:
     return "[" + ", ".join([f"{x:.4f}" for x in array]) + "]"
 
 
-# Function to generate a dictionary mapping each letter to its frequency in the encrypted text.
-def get_letters_map(encrypted_text: str) -> dict[str, int]:
+# Function to count the occurrences of each letter of the alphabet in the encrypted text.
+def get_letters_counts(encrypted_text: bytes) -> list[int]:
     """
-    Generate a dictionary mapping each letter to its frequency in the encrypted text.
+    Count the occurrences of each letter of the alphabet in the encrypted text.
 
     Args:
-        encrypted_text (str): The encrypted text.
+        encrypted_text (bytes): The encrypted text.
 
     Returns:
-        dict[str, int]: A dictionary with letters as keys and their frequencies as values.
+        list[int]: The number of occurrences of each letter, in alphabetical order.
     """
-    # Count the occurrences of each letter in the encrypted text
-    # and store them in a dictionary.
-    letters_map = {}
-    for letter in encrypted_text:
-        if letter in letters_map:
-            letters_map[letter] += 1
-        else:
-            letters_map[letter] = 1
-    return letters_map
+    # Count the occurrences of each letter of the alphabet in the encrypted text.
+    # bytes.count scans the whole text in C for each letter, which is faster than hashing every character.
+    # Keeping the counts in a plain list indexed by alphabet position avoids a dictionary per text.
+    return [encrypted_text.count(letter) for letter in ALPHABET.encode()]
 
 
 # Function to calculate the index of coincidence of the text.
-def calculate_coincidence_index(letters_map: dict[str, int]) -> float:
+def calculate_coincidence_index(letters_counts: list[int], total_letters: int) -> float:
     """
     Calculate the index of coincidence of the text.
 
     Args:
-        letters_map (dict[str, int]): A dictionary with letters as keys and their frequencies as values.
+        letters_counts (list[int]): The number of occurrences of each letter of the alphabet in the text.
+        total_letters (int): The number of letters in the text.
 
     Returns:
         float: The index of coincidence.
     """
     # Calculate the index of coincidence based on the frequencies of letters in the text.
-    coincidence_index = 0
-    total_letters = sum(letters_map.values())
-    for letter in letters_map:
-        letter_frequency = letters_map[letter]
-        coincidence_index += (letter_frequency * (letter_frequency - 1)
-                              ) / (total_letters * (total_letters - 1))
-    return coincidence_index
+    # The denominator is the same for every letter, so divide only once after summing.
+    # The sum of f * (f - 1) over all letters equals the sum of f * f minus the number of letters.
+    matching_pairs = sum(frequency * frequency for frequency in letters_counts) - total_letters
+    return matching_pairs / (total_letters * (total_letters - 1))
 
 
 # Function to divide the encrypted text into N parts.
-def divide_text(encrypted_text: str, number_of_parts: int) -> list[str]:
+def divide_text(encrypted_text: bytes, number_of_parts: int) -> list[bytes]:
     """
     Divide the encrypted text into N parts.
 
     Args:
-        encrypted_text (str): The encrypted text.
+        encrypted_text (bytes): The encrypted text.
         number_of_parts (int): The number of parts to divide the text into.
 
     Returns:
-        list[str]: A list containing the divided parts of the text.
+        list[bytes]: A list containing the divided parts of the text.
     """
     # Divide the text into N parts by taking every Nth character.
-    divided_text = []
-    for i in range(number_of_parts):
-        divided_text.append(encrypted_text[i::number_of_parts])
-    return divided_text
+    # Each part is a single strided slice, copied in C, so no character is visited by Python code.
+    return [encrypted_text[i::number_of_parts] for i in range(number_of_parts)]
 
 
 # Function to join the divided text back into a single text.
-def join_text(divided_text: list[str], number_of_parts: int) -> str:
+def join_text(divided_text: list[bytes], number_of_parts: int) -> bytearray:
     """
     Join the divided text back into a single text.
 
     Args:
-        divided_text (list[str]): A list containing the divided parts of the text.
+        divided_text (list[bytes]): A list containing the divided parts of the text.
         number_of_parts (int): The number of parts to divide the text into.
 
     Returns:
-        str: The joined text.
-    """
-    # Reconstruct the original text by taking characters from each part in order.
-    joined_text = ""
-    for i in range(len(divided_text[0])):
-        for j in range(number_of_parts):
-            if i < len(divided_text[j]):
-                joined_text += divided_text[j][i]
+        bytearray: The joined text.
+    """
+    # Reconstruct the original text by writing each part back to every Nth position of a preallocated buffer.
+    joined_text = bytearray(sum(len(part) for part in divided_text))
+    for i, part in enumerate(divided_text):
+        joined_text[i::number_of_parts] = part
     return joined_text
 
 
+# Function to count the letters and calculate the index of coincidence of every sub-text.
+def score_sub_texts(sub_texts: list[bytes], text_letters_counts: list[int]) -> tuple[list[list[int]], list[float]]:
+    """
+    Count the letters and calculate the index of coincidence of every sub-text.
+
+    Args:
+        sub_texts (list[bytes]): A list containing the divided parts of the text.
+        text_letters_counts (list[int]): The number of occurrences of each letter of the alphabet in the whole text.
+
+    Returns:
+        tuple[list[list[int]], list[float]]: The letters counts of each sub-text, one row per sub-text,
+        and the index of coincidence of each sub-text.
+    """
+    # Count the letters of every sub-text first and derive the coincidence indexes from them,
+    # so each sub-text is scanned only once per candidate key length.
+    # The letters counts of all sub-texts add up to the letters counts of the whole text,
+    # so the last row is obtained by subtracting the sum of each column instead of scanning its sub-text.
+    letters_counts_matrix = [get_letters_counts(text) for text in sub_texts[:-1]]
+    letters_counts_matrix.append([text_count - sum(letters_counts[i] for letters_counts in letters_counts_matrix)
+                                  for i, text_count in enumerate(text_letters_counts)])
+    coincidence_indexes = [calculate_coincidence_index(letters_counts, len(text))
+                           for letters_counts, text in zip(letters_counts_matrix, sub_texts)]
+    return letters_counts_matrix, coincidence_indexes
+
+
 # Function to check if all coincidence indexes match the target index.
 def coincidence_indexes_match(coincidence_indexes: list[float], target_index: float) -> bool:
     """
@@ -172,10 +235,8 @@ def coincidence_indexes_match(coincidence_indexes: list[float], target_index: fl
         bool: True if all coincidence indexes are close to the target index, False otherwise.
     """
     # Check if all coincidence indexes are within a threshold of the target index.
-    for index in coincidence_indexes:
-        if abs(index - target_index) > 0.1:
-                        return False
-    return True
+    # all() stops at the first index outside the threshold.
+    return all(abs(index - target_index) <= 0.1 for index in coincidence_indexes)
 
 
 # Function to get the position of a letter in the alphabet.
@@ -187,10 +248,10 @@ def position_in_alphabet(letter: str) -> int:
         letter (str): The letter.
 
     Returns:
-        int: The position of the letter in the alphabet.
+        int: The zero-based position of the letter in the alphabet.
     """
     # Calculate the position of a letter in the alphabet based on its Unicode value.
-    return ord(letter) - ord("a") + 1
+    return ord(letter) - ord("a")
 
 
 # Function to get the letter at a given position in the alphabet.
@@ -199,13 +260,13 @@ def letter_in_alphabet(position: int) -> str:
     Get the letter at a given position in the alphabet.
 
     Args:
-        position (int): The position of the letter in the alphabet.
+        position (int): The zero-based position of the letter in the alphabet.
 
     Returns:
         str: The letter at the given position in the alphabet.
     """
     # Calculate the letter at a given position in the alphabet based on Unicode values.
-    return chr(position + ord("a") - 1)
+    return chr(position + ord("a"))
 
 
 # Function to calculate the shift needed to go from start_letter to end_letter.
@@ -218,14 +279,11 @@ def calculate_shift(start_letter: str, end_letter: str) -> int:
         end_letter (str): The end letter.
 
     Returns:
-        int: The shift needed to go from start_letter to end_letter.
+        int: The shift needed to go from start_letter to end_letter, between 0 and 25.
     """
     # Calculate the shift needed to transform one letter into another, considering the circular nature of the alphabet.
-    position_1 = position_in_alphabet(start_letter)
-    position_2 = position_in_alphabet(end_letter)
-    if position_2 >= position_1:
-        return position_2 - position_1 + 1
-    return 26 - position_1 + position_2 + 1
+    # The modulo wraps the difference around the alphabet without branching.
+    return (position_in_alphabet(end_letter) - position_in_alphabet(start_letter)) % 26
 
 
 # Function to generate all possible combinations of characters by choosing letters from either string.
@@ -240,16 +298,41 @@ def string_combinations(str1: str, str2: str) -> list:
     Returns:
         list: A list of all possible combinations of characters.
     """
-    def generate_combinations(str1: str, str2: str, index: int, current: list):
-        if index == len(str1):
-            combinations.append(''.join(current))
-            return
-        generate_combinations(str1, str2, index + 1, current + [str1[index]])
-        generate_combinations(str1, str2, index + 1, current + [str2[index]])
+    # Pair the letters of both strings by position and take every selection of one letter per pair.
+    # The letter from the first string comes first in each pair, so the order matches a depth-first search.
+    return [''.join(combination) for combination in product(*zip(str1, str2))]
 
-    combinations = []
-    generate_combinations(str1, str2, 0, [])
-    return combinations
+
+# Function to decrypt the divided encrypted text using each of the key passwords.
+def decrypt_texts(sub_texts: list[bytes], passwords: list[str]) -> Iterator[tuple[str, bytearray]]:
+    """
+    Decrypt the divided encrypted text using each of the key passwords.
+
+    Args:
+        sub_texts (list[bytes]): A list containing the divided parts of the encrypted text, one per key letter.
+        passwords (list[str]): The key passwords.
+
+    Yields:
+        tuple[str, bytearray]: The key password and the text decrypted with it. The same buffer is reused
+        for every key password, so it must be consumed before the next one is requested.
+    """
+    # Every sub-text was shifted by the same key letter, so each one is decrypted with a single
+    # bytes.translate call on the already divided text and written to every Nth position of the buffer.
+    # Consecutive key passwords share most of their letters, so only the sub-texts whose key letter
+    # changed are written again, and each sub-text is translated at most once per key letter.
+    key_length = len(sub_texts)
+    decrypted_text = bytearray(sum(len(text) for text in sub_texts))
+    decrypted_sub_texts = {}
+    current_password = [""] * key_length
+    for password in passwords:
+        for i, key_letter in enumerate(password):
+            if current_password[i] == key_letter:
+                continue
+            if (i, key_letter) not in decrypted_sub_texts:
+                decrypted_sub_texts[(i, key_letter)] = sub_texts[i].translate(DECRYPTION_TABLES[key_letter])
+            decrypted_text[i::key_length] = decrypted_sub_texts[(i, key_letter)]
+            current_password[i] = key_letter
+        yield password, decrypted_text
 
 
 # Main function.
@@ -261,40 +344,48 @@ def main():
     # Reading the encrypted text file.
     if not file_path.endswith(".txt"):
         file_path += ".txt"
-    file_reader = open(file_path, "r")
-    encrypted_text = file_reader.read()
-    file_reader.close()
+    # Read the text as bytes, so the same buffer is sliced and counted by every step below without decoding it.
+    # Uppercase letters are lowered and any other character (spaces, punctuation, line breaks) is dropped,
+    # so that only letters are counted and every letter of the key lines up with a letter of the text.
+    with open(file_path, "rb") as file_reader:
+        encrypted_text = file_reader.read().lower().translate(None, NON_ALPHABET_BYTES)
+
+    # Count the letters of the whole text once, it is shared by every candidate key length.
+    text_letters_counts = get_letters_counts(encrypted_text)
 
     # Try different key lengths from 1 to 20.
+    # Longer keys are skipped when their sub-texts would be too short for a reliable index of coincidence.
+    max_key_length = max(1, min(MAX_KEY_LENGTH, len(encrypted_text) // MIN_SUB_TEXT_LENGTH))
     key_length = 0
-    sub_texts = []
+    key_sub_texts, key_letters_counts_matrix = [], []
     language = "UNKNOWN"
-    for i in range(1, 21):
+    for i in range(1, max_key_length + 1):
         sub_texts = divide_text(encrypted_text, i)
-        coincidence_indexes = []
-        is_english_results, is_portuguese_results = [], []
 
         # Calculate the index of coincidence for each divided text.
-        for text in sub_texts:
-            letters_map = get_letters_map(text)
-            coincidence_indexes.append(
-                calculate_coincidence_index(letters_map))
-            is_english_results.append(is_text_english(letters_map))
-            is_portuguese_results.append(is_text_portuguese(letters_map))
+        letters_counts_matrix, coincidence_indexes = score_sub_texts(sub_texts, text_letters_counts)
 
         # Check if all coincidence indexes match the typical index of coincidence for English or Portuguese texts.
         # Also check if the two most frequent letters in each sub-text are close to the most frequent letters in English or Portuguese texts.
         # If so, the length of the key is likely found.
-        if coincidence_indexes_match(coincidence_indexes, ENGLISH_COINCIDENCE_INDEX) and all(is_english_results):
+        # The most frequent letters are only looked up when the coincidence indexes match at least one of the languages.
+        matches_english_index = coincidence_indexes_match(coincidence_indexes, ENGLISH_COINCIDENCE_INDEX)
+        matches_portuguese_index = coincidence_indexes_match(coincidence_indexes, PORTUGUESE_COINCIDENCE_INDEX)
+        most_frequent_letters_frequencies = []
+        if matches_english_index or matches_portuguese_index:
+            most_frequent_letters_frequencies = get_most_frequent_letters_frequencies(letters_counts_matrix)
+        if matches_english_index and is_text_english(most_frequent_letters_frequencies):
             key_length = i
+            key_sub_texts, key_letters_counts_matrix = sub_texts, letters_counts_matrix
             language = "ENGLISH"
             print(
                 f"=> For Key Length = {i}, Coincidence Indexes = {pretty_print_float_array(coincidence_indexes)} [MATCHED]")
             print(f"=> The key length is likely {key_length}")
             print(f"=> The text was likely written in English")
             break
-        elif coincidence_indexes_match(coincidence_indexes, PORTUGUESE_COINCIDENCE_INDEX) and all(is_portuguese_results):
+        elif matches_portuguese_index and is_text_portuguese(most_frequent_letters_frequencies):
             key_length = i
+            key_sub_texts, key_letters_counts_matrix = sub_texts, letters_counts_matrix
             language = "PORTUGUESE"
             print(
                 f"=> For Key Length = {i}, Coincidence Indexes = {pretty_print_float_array(coincidence_indexes)} [MATCHED]")
@@ -304,14 +395,19 @@ def main():
         print(
             f"=> For Key Length = {i}, Coincidence Indexes = {pretty_print_float_array(coincidence_indexes)} [NO MATCH]")
 
+    # Stop if no key length matched, as there is no key password to look for.
+    if key_length == 0:
+        print(f"=> No key length from 1 to {max_key_length} matched English or Portuguese texts")
+        sys.exit(1)
+
     print("=" * 70 + " SECOND STEP [KEY PASSWORD] " + "=" * 68)
 
     # Iterate over each sub-text and find the most frequent letter to decrypt the text.
+    # The letters counts computed for the matched key length in the first step are reused, so no sub-text is counted again.
     password_by_shifting_all_by_most_frequent_letter = ""
     password_by_shifting_all_by_second_most_frequent_letter = ""
-    for i, text in enumerate(sub_texts):
-        letters_map = get_letters_map(text)
-        text_most_frequent_letter = max(letters_map, key=letters_map.get)
+    for i, letters_counts in enumerate(key_letters_counts_matrix):
+        text_most_frequent_letter = ALPHABET[letters_counts.index(max(letters_counts))]
         language_most_frequent_letters = ENGLISH_MOST_FREQUENT_LETTERS if language == "ENGLISH" else PORTUGUESE_MOST_FREQUENT_LETTERS
         if i == 0:
             print(f"=> Considering the language's most frequent letters {language_most_frequent_letters} for performing the shifts")
@@ -357,15 +453,10 @@ def main():
             password = input("The key password you entered is not in the list. Please enter a valid key password: ")
         possible_passwords = [password]
 
-    for password in possible_passwords:
-        decrypted_text = ""
-        for i, letter in enumerate(encrypted_text):
-            shift = calculate_shift(password[i % key_length], letter)
-            decrypted_text += letter_in_alphabet(shift)
+    for password, decrypted_text in decrypt_texts(key_sub_texts, possible_passwords):
+        # Write the decrypted buffer straight to the file, without encoding it again.
         save_path = f"decrypted/{password}.txt"
-        file_writer = open(save_path, "w")
-        file_writer.write(decrypted_text)
-        file_writer.close()
+        Path(save_path).write_bytes(decrypted_text)
         print(f"=> Decrypted text using key password '{password}' saved to '{save_path}'")
     print("=" * 70 + " END " + "=" * 92)
 